@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 import sys
-import requests
 import argparse
+import asyncio
+import hashlib
 import os
-from openai import AzureOpenAI, OpenAI
+import re
+import time
+from pathlib import Path
+import orjson
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 
 SAMPLE_PROMPT = """
 Generate a detailed user story for a software development task with the following structure:
@@ -32,6 +42,8 @@ As a [type of user], I want [goal] so that [benefit].
 - Checklist of items that must be completed for this story to be considered done
 """
 
+# Kept short on purpose: it only has to show the expected structure, and
+# every token of it is sent with each request.
 GOOD_SAMPLE_RESPONSE = """
 # Implement User Authentication System
 
@@ -39,96 +51,122 @@ GOOD_SAMPLE_RESPONSE = """
 As a developer, I want to implement user authentication so that users can securely access their accounts.
 
 ## Acceptance Criteria
-- Users can register with email and password
-- Users can log in with their credentials
-- Users can log out from the application
+- Users can register, log in and log out with email and password
 - Session tokens expire after 24 hours
 - Failed login attempts are limited to 5 per hour
 
 ## Technical Details
-- Use JWT tokens for authentication
-- Hash passwords using bcrypt
-- Store user credentials in the database
-- Implement rate limiting for login attempts
-- Add middleware for protected routes
+- Use JWT tokens and hash passwords with bcrypt
 - Dependencies: bcrypt, jsonwebtoken libraries
 
 ## Testing Strategy
 - Unit tests for authentication functions
-- Integration tests for login/logout flow
-- Security testing for password hashing
-- Load testing for rate limiting
-- Edge case testing (invalid credentials, expired tokens)
+- Integration tests for the login/logout flow
 
 ## Definition of Done
 - [ ] Code is written and reviewed
-- [ ] Unit tests pass with >80% coverage
-- [ ] Integration tests pass
-- [ ] Security scan shows no vulnerabilities
+- [ ] Tests pass with >80% coverage
 - [ ] Documentation is updated
-- [ ] Feature is deployed to staging environment
 """
 
 COMPLETION_PROMPT = """
 Based on the provided information, generate a comprehensive user story following the structure above.
 """
 
+# Final user message; only the placeholders change between requests
+_USER_TEMPLATE = (
+    "\n" + COMPLETION_PROMPT + "\n\n"
+    "Title: {title}\n"
+    "Description: {description}\n"
+    "Complexity: {complexity}\n"
+    "Estimated Duration: {duration}\n"
+    "\n"
+    "Please generate a complete user story that addresses this requirement.\n"
+)
 
-def extract_title_from_response(response_text):
-    """
-    Extract the title from the LLM response.
-    Expected format: # Title\n or Title:\n at the beginning of the response.
-    Rejects generic placeholders like "Title" or bracketed template text.
-    Falls back to first line if no proper title is found.
-    """
-    lines = response_text.strip().split('\n')
-    
-    # Generic placeholders that should be rejected
-    INVALID_TITLES = {
-        'title',
-        '[a concise, descriptive title for the user story]',
-        '[title]',
-        'user story',
-    }
-    
-    def is_valid_title(text):
-        """Check if extracted title is valid (not a placeholder)."""
-        cleaned = text.strip().lower()
-        
-        # Reject empty or very short titles
-        if len(cleaned) < 2:
-            return False
-        
-        # Reject known placeholders
-        if cleaned in INVALID_TITLES:
-            return False
-        
-        # Reject text in brackets (template format)
-        if cleaned.startswith('[') and cleaned.endswith(']'):
-            return False
-        
-        # Reject single generic words
-        if cleaned in ['title', 'name', 'heading', 'header']:
-            return False
-        
-        return True
-    
-    # Only check the first few lines for the title (avoid false positives in body)
-    for i, line in enumerate(lines[:5]):
-        # Check for markdown header (# Title)
-        if line.strip().startswith('# ') and not line.strip().startswith('##'):
-            title_text = line.strip()[2:].strip()
-            if is_valid_title(title_text):
-                return title_text
-        
-        # Check for "Title:" format
-        if line.lower().startswith('title:'):
-            title_text = line.split(':', 1)[1].strip()
-            if is_valid_title(title_text):
-                return title_text
-    
+# Generations shorter than this (e.g. empty or filtered responses) are
+# rejected instead of being turned into an issue
+MIN_USER_STORY_LENGTH = 64
+
+# Maximum number of createIssue mutations sent in one GraphQL request
+GRAPHQL_ISSUES_PER_REQUEST = 20
+
+# Seconds to wait for a response to such a request, which GitHub may take
+# well over the client's default 30s read timeout to process
+GRAPHQL_MUTATION_TIMEOUT = 120.0
+
+# Generated user stories are cached here so identical re-runs skip the LLM
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "llm-create-issue"
+
+# Static conversation prefix shared by every request; only the final user
+# message changes between calls.
+_PREFIX_MSGS = (
+    {
+        "role": "system",
+        "content": "You are a helpful assistant who writes detailed user stories for software development.",
+    },
+    {"role": "user", "content": SAMPLE_PROMPT},
+    {"role": "assistant", "content": GOOD_SAMPLE_RESPONSE},
+)
+
+
+# A title line is either a level-1 markdown header ("# Title") or a
+# "Title: ..." label. Group 1 holds the header text, group 2 the label text;
+# trailing whitespace is stripped by the caller, since matching it here
+# with a lazy group backtracks quadratically on long whitespace runs.
+_TITLE_LINE_RE = re.compile(r"^[^\S\n]*# [^\S\n]*(\S.*)$|^(?i:title):(.*)$", re.M)
+
+# A "## User Story" heading line followed by an "As a ..." line (group 1)
+_USER_STORY_RE = re.compile(r"^.*(?i:## user story).*\n[^\S\n]*(As a.*)$", re.M)
+
+# Number of leading lines searched for the title
+_TITLE_SEARCH_LINES = 5
+
+# Generic placeholders that should be rejected
+_INVALID_TITLES = frozenset({
+    'title',
+    '[a concise, descriptive title for the user story]',
+    '[title]',
+    'user story',
+    'name',
+    'heading',
+    'header',
+})
+
+
+def _is_valid_title(text):
+    """Check if extracted title is valid (not a placeholder)."""
+    cleaned = text.strip().lower()
+
+    # Reject empty or very short titles
+    if len(cleaned) < 2:
+        return False
+
+    # Reject known placeholders and single generic words
+    if cleaned in _INVALID_TITLES:
+        return False
+
+    # Reject text in brackets (template format)
+    if cleaned.startswith('[') and cleaned.endswith(']'):
+        return False
+
+    return True
+
+
+def _head_end(text, line_count=_TITLE_SEARCH_LINES):
+    """Return the offset at which the first line_count lines of text end."""
+    end = -1
+    for _ in range(line_count):
+        end = text.find('\n', end + 1)
+        if end == -1:
+            return len(text)
+    return end
+
+
+def _fallback_title(response_text, head_end):
+    """Derive a title when none of the first lines is a valid title line."""
     # Fallback: use the first non-empty line as title if it's valid
-    for line in lines[:5]:
+    for line in response_text[:head_end].split('\n'):
         if line.strip():
             stripped = line.strip()
             # Skip markdown headers at this point
@@ -137,44 +175,689 @@ def extract_title_from_response(response_text):
             # Skip lines that look like labels (Title:, Name:, etc.)
             if ':' in stripped:
                 continue
-            if is_valid_title(stripped):
+            if _is_valid_title(stripped):
                 return stripped
-    
+
     # Ultimate fallback: extract from User Story section or description
-    for i, line in enumerate(lines):
-        if '## user story' in line.lower() and i + 1 < len(lines):
-            # Try to extract a meaningful phrase from the user story
-            next_line = lines[i + 1].strip()
-            if next_line.startswith('As a'):
-                # Try to extract goal from "As a [user], I want [goal]..."
-                parts = next_line.split('I want')
-                if len(parts) > 1:
-                    goal = parts[1].split('so that')[0].strip()
-                    # Create title from goal (limit to ~50 chars)
-                    if goal and len(goal) > 5:
-                        return goal[:50].strip() if len(goal) > 50 else goal.strip()
-    
+    match = _USER_STORY_RE.search(response_text)
+    while match:
+        # Try to extract a meaningful phrase from the user story
+        next_line = match.group(1).strip()
+        # Try to extract goal from "As a [user], I want [goal]..."
+        parts = next_line.split('I want')
+        if len(parts) > 1:
+            goal = parts[1].split('so that')[0].strip()
+            # Create title from goal (limit to ~50 chars)
+            if goal and len(goal) > 5:
+                return goal[:50].strip() if len(goal) > 50 else goal.strip()
+        # The "As a" line may itself contain the heading, so resume there
+        next_line_start = response_text.rfind('\n', 0, match.start(1)) + 1
+        match = _USER_STORY_RE.search(response_text, next_line_start)
+
     return "User Story"  # Ultimate fallback
 
 
+def extract_title_and_body(response_text):
+    """
+    Extract the title and the body from the LLM response in a single pass.
+    The body is everything after the first title line (a "# " header or a
+    "Title:" label) within the first few lines, or the whole response if
+    there is none. The title is the first such line that is not a generic
+    placeholder like "Title" or bracketed template text; see
+    _fallback_title() for responses without one.
+    """
+    response_text = response_text.strip()
+
+    # Only check the first few lines for the title (avoid false positives in body)
+    head_end = _head_end(response_text)
+    title = None
+    body = None
+    for match in _TITLE_LINE_RE.finditer(response_text, 0, head_end):
+        if body is None:
+            # Everything after the first title line is the body
+            body = response_text[match.end():].strip()
+        title_text = (match.group(1) or match.group(2)).strip()
+        if _is_valid_title(title_text):
+            title = title_text
+            break
+
+    if title is None:
+        title = _fallback_title(response_text, head_end)
+    if body is None:
+        # If no title found in first few lines, return the whole response
+        body = response_text
+
+    return title, body
+
+
+def extract_title_from_response(response_text):
+    """
+    Extract the title from the LLM response.
+    Expected format: # Title\n or Title:\n at the beginning of the response.
+    Rejects generic placeholders like "Title" or bracketed template text.
+    Falls back to first line if no proper title is found.
+    """
+    return extract_title_and_body(response_text)[0]
+
+
 def extract_body_from_response(response_text):
     """
     Extract the body (everything except the title) from the LLM response.
     Removes the title line from the response.
     """
-    lines = response_text.strip().split('\n')
-    
-    # Find and skip the title line (only check first few lines)
-    for i, line in enumerate(lines[:5]):
-        if line.strip().startswith('# ') or line.lower().startswith('title:'):
-            # Return everything after the title line
-            return '\n'.join(lines[i+1:]).strip()
-    
-    # If no title found in first few lines, return the whole response
-    return response_text.strip()
+    return extract_title_and_body(response_text)[1]
 
 
-def main():
+def extract_title_from_partial_response(partial_text):
+    """
+    Extract the title from the beginning of a streamed LLM response.
+    Only complete lines are considered. Returns the title as soon as a valid
+    title line has arrived, an empty string once the lines searched for a
+    title are complete without one, and None while more text is needed.
+    """
+    partial_text = partial_text.lstrip()
+    complete_end = partial_text.rfind('\n')
+    if complete_end == -1:
+        return None
+
+    head_end = _head_end(partial_text)
+    for match in _TITLE_LINE_RE.finditer(partial_text, 0, min(head_end, complete_end)):
+        title_text = (match.group(1) or match.group(2)).strip()
+        if _is_valid_title(title_text):
+            return title_text
+
+    if head_end <= complete_end:
+        return ""
+    return None
+
+
+def parse_issue_descriptions(issue_description):
+    """
+    Split the issue description input into one description per issue.
+    A JSON array of strings creates one issue per entry (batch mode);
+    any other value is treated as a single description. Blank entries are
+    dropped, so an array with only blank entries yields no descriptions.
+    """
+    stripped = issue_description.strip()
+    if stripped.startswith('['):
+        try:
+            parsed = orjson.loads(stripped)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, list) and all(isinstance(item, str) for item in parsed):
+            return [item for item in parsed if item.strip()]
+
+    return [issue_description]
+
+
+def build_user_prompt(issue_title, issue_description, complexity, duration):
+    """Prepare the completion prompt with the user-provided information."""
+    return _USER_TEMPLATE.format_map({
+        "title": issue_title,
+        "description": issue_description,
+        "complexity": complexity,
+        "duration": duration,
+    })
+
+
+def is_usable_user_story(user_story):
+    """Check that a generation is long enough to be worth creating an issue for."""
+    return bool(user_story) and len(user_story.strip()) >= MIN_USER_STORY_LENGTH
+
+
+def _cache_path(cache_dir, model, temperature, max_tokens, num_variants, messages):
+    """Return the cache file for a request, keyed by its model settings and prompt."""
+    prompt = orjson.dumps(messages, option=orjson.OPT_SORT_KEYS)
+    key = hashlib.sha256(
+        f"{model}|{temperature}|{max_tokens}|{num_variants}|".encode() + prompt
+    ).hexdigest()
+    return cache_dir / f"{key}.json"
+
+
+def read_cached_user_stories(path, ttl):
+    """Return the cached user stories at path, or None if missing or older than ttl seconds."""
+    try:
+        if time.time() - path.stat().st_mtime > ttl:
+            return None
+        user_stories = orjson.loads(path.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(user_stories, list) or not user_stories:
+        return None
+    return user_stories
+
+
+def write_cached_user_stories(path, user_stories):
+    """Store generated user stories; caching is best effort and never fails the run."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(orjson.dumps(user_stories))
+    except OSError as error:
+        print(f"Warning: could not write cache file {path}: {error}")
+
+
+async def _call_llm(openai_client, messages, model, temperature, max_tokens, num_variants=1):
+    """
+    Send one chat completion request and return the generated texts.
+    With num_variants > 1 the candidates are sampled server-side in the same
+    request (n=), so the prompt is sent and billed only once.
+    The response is streamed, and each candidate's title is reported as soon
+    as its first lines arrive.
+    """
+    stream = await openai_client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        n=num_variants,
+        stream=True,
+    )
+
+    buffers = [[] for _ in range(num_variants)]
+    titles = [None] * num_variants
+    async for chunk in stream:
+        # Azure sends chunks without choices (e.g. content filter results)
+        for choice in chunk.choices:
+            delta = choice.delta.content
+            if not delta:
+                continue
+            buffers[choice.index].append(delta)
+            if titles[choice.index] is None and '\n' in delta:
+                title = extract_title_from_partial_response(''.join(buffers[choice.index]))
+                if title is not None:
+                    titles[choice.index] = title
+                    if title:
+                        print(f"Generating user story: {title}")
+
+    return [''.join(buffer) for buffer in buffers]
+
+
+def _llm_retrying():
+    """
+    Retry policy for OpenAI API calls: rate limits and transient API or
+    connection errors are retried with randomized exponential backoff.
+    """
+    # The SDK is only imported once an API call is actually needed; it is
+    # the bulk of this script's import time.
+    import httpx
+    from openai import APIConnectionError, InternalServerError, RateLimitError
+
+    return AsyncRetrying(
+        retry=retry_if_exception_type(
+            (RateLimitError, APIConnectionError, InternalServerError, httpx.TransportError)
+        ),
+        wait=wait_random_exponential(min=1, max=60),
+        stop=stop_after_attempt(6),
+        reraise=True,
+    )
+
+
+async def _retry_llm_call(call, *args, **kwargs):
+    """Await call(*args, **kwargs) under the _llm_retrying() policy."""
+    async for attempt in _llm_retrying():
+        with attempt:
+            return await call(*args, **kwargs)
+
+
+def _batch_error_message(result):
+    """Return the error message of a failed request in a Batch API result file."""
+    response = result.get("response") or {}
+    error = result.get("error") or (response.get("body") or {}).get("error")
+    if isinstance(error, dict) and error.get("message"):
+        return error["message"]
+    return str(error or response.get("body"))
+
+
+async def run_batch_job(
+    openai_client,
+    batch_endpoint,
+    messages_list,
+    model,
+    temperature,
+    max_tokens,
+    num_variants=1,
+):
+    """
+    Generate user stories through the asynchronous Batch API: upload all
+    requests as one JSONL file, wait for the batch to finish and download
+    the results. Batches are billed at a discount and use a separate rate
+    limit, at the cost of latency (up to the 24h completion window).
+    Returns a list aligned with messages_list holding either the list of
+    generated texts or the exception for that request.
+    """
+    batch_lines = []
+    for index, messages in enumerate(messages_list):
+        batch_lines.append(orjson.dumps({
+            "custom_id": f"request-{index}",
+            "method": "POST",
+            "url": batch_endpoint,
+            "body": {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "n": num_variants,
+            },
+        }))
+    batch_input = b"\n".join(batch_lines) + b"\n"
+
+    batch_file = await _retry_llm_call(
+        openai_client.files.create,
+        file=("user_stories.jsonl", batch_input),
+        purpose="batch",
+    )
+    batch = await _retry_llm_call(
+        openai_client.batches.create,
+        input_file_id=batch_file.id,
+        endpoint=batch_endpoint,
+        completion_window="24h",
+    )
+    print(f"Submitted batch {batch.id} with {len(messages_list)} request(s)")
+
+    try:
+        poll_interval = 5
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, 60)
+            batch = await _retry_llm_call(openai_client.batches.retrieve, batch.id)
+            print(f"Batch {batch.id} status: {batch.status}")
+    except Exception:
+        # The batch keeps running (and is billed) on OpenAI's side
+        print(f"Giving up on batch {batch.id}; its results can still be retrieved with the Batch API")
+        raise
+
+    # Batch-level errors, e.g. an input file that failed validation
+    batch_errors = [error.message for error in (batch.errors and batch.errors.data) or []]
+    for message in batch_errors:
+        print(f"Batch {batch.id} error: {message}")
+    if batch.status == "failed":
+        raise RuntimeError(f"Batch {batch.id} failed: {'; '.join(batch_errors) or 'no details'}")
+
+    results = [
+        RuntimeError(f"No result in batch {batch.id} (status '{batch.status}')")
+        for _ in messages_list
+    ]
+    # Successful requests are written to the output file and failed ones to
+    # the error file. Expired or cancelled batches may still hold results
+    # for the requests that finished in time.
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        try:
+            batch_file_content = await _retry_llm_call(openai_client.files.content, file_id)
+        except Exception:
+            print(f"Giving up on batch {batch.id}; its results can still be retrieved with the Batch API")
+            raise
+        for line in batch_file_content.content.splitlines():
+            if not line.strip():
+                continue
+            result = orjson.loads(line)
+            index = int(result["custom_id"].rsplit("-", 1)[1])
+            response = result.get("response") or {}
+            if result.get("error") or response.get("status_code") != 200:
+                results[index] = RuntimeError(f"Batch request failed: {_batch_error_message(result)}")
+                continue
+            choices = sorted(response["body"]["choices"], key=lambda choice: choice["index"])
+            results[index] = [choice["message"]["content"] for choice in choices]
+
+    return results
+
+
+async def generate_user_stories(
+    http_client,
+    user_prompts,
+    openai_api_key,
+    azure_openai_api_key,
+    azure_openai_endpoint,
+    azure_openai_version,
+    open_ai_model,
+    model_temperature,
+    max_prompt_tokens,
+    max_concurrency,
+    num_variants=1,
+    cache_dir=None,
+    cache_ttl=0,
+    batch_mode=False,
+    retry_on_short=0,
+):
+    """
+    Generate num_variants user stories per prompt, running the LLM calls
+    concurrently over the shared http_client.
+    At most max_concurrency requests are in flight at once; rate limits and
+    transient API errors are retried with randomized exponential backoff.
+    With batch_mode, the requests are submitted as one Batch API job instead.
+    Otherwise, candidates that come back empty or too short are re-sampled
+    up to retry_on_short times.
+    When cache_dir is set, stories generated within cache_ttl seconds for an
+    identical request are reused instead of calling the LLM again.
+    Returns a list aligned with user_prompts holding either the list of
+    generated texts or the exception raised for that prompt.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    messages_list = [
+        [*_PREFIX_MSGS, {"role": "user", "content": user_prompt}]
+        for user_prompt in user_prompts
+    ]
+
+    cache_paths = [None] * len(messages_list)
+    results = [None] * len(messages_list)
+    if cache_dir is not None:
+        for index, messages in enumerate(messages_list):
+            cache_paths[index] = _cache_path(
+                cache_dir,
+                open_ai_model,
+                model_temperature,
+                max_prompt_tokens,
+                num_variants,
+                messages,
+            )
+            results[index] = read_cached_user_stories(cache_paths[index], cache_ttl)
+            if results[index] is not None:
+                print(f"Using cached user story from {cache_paths[index]}")
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    if not pending:
+        return results
+
+    # Use OpenAI or Azure OpenAI based on which API key is provided
+    if openai_api_key:
+        print("Using OpenAI API...")
+        from openai import AsyncOpenAI
+        openai_client = AsyncOpenAI(
+            api_key=openai_api_key,
+            http_client=http_client,
+            max_retries=0,
+        )
+        batch_endpoint = "/v1/chat/completions"
+    else:
+        print("Using Azure OpenAI API...")
+        from openai import AsyncAzureOpenAI
+        openai_client = AsyncAzureOpenAI(
+            api_key=azure_openai_api_key,
+            azure_endpoint=azure_openai_endpoint,
+            api_version=azure_openai_version,
+            http_client=http_client,
+            max_retries=0,
+        )
+        batch_endpoint = "/chat/completions"
+
+    async def sample(messages, count):
+        # Retries are handled here rather than by the SDK so that the
+        # backoff sleep happens outside the semaphore.
+        async for attempt in _llm_retrying():
+            with attempt:
+                async with semaphore:
+                    return await _call_llm(
+                        openai_client,
+                        messages,
+                        open_ai_model,
+                        model_temperature,
+                        max_prompt_tokens,
+                        count,
+                    )
+
+    async def generate_one(messages):
+        user_stories = []
+        for attempt in range(retry_on_short + 1):
+            missing = num_variants - len(user_stories)
+            if attempt:
+                print(f"Re-sampling {missing} user story(ies) that came back empty or too short...")
+            sampled = await sample(messages, missing)
+            usable = [story for story in sampled if is_usable_user_story(story)]
+            user_stories += usable
+            if len(user_stories) == num_variants:
+                return user_stories
+        # Hand the rejected candidates back so the caller can report them
+        return user_stories + [story for story in sampled if story not in usable]
+
+    if batch_mode:
+        try:
+            generated = await run_batch_job(
+                openai_client,
+                batch_endpoint,
+                [messages_list[index] for index in pending],
+                open_ai_model,
+                model_temperature,
+                max_prompt_tokens,
+                num_variants,
+            )
+        except Exception as error:
+            generated = [error] * len(pending)
+    else:
+        generated = await asyncio.gather(
+            *[generate_one(messages_list[index]) for index in pending],
+            return_exceptions=True,
+        )
+
+    for index, generated_user_stories in zip(pending, generated):
+        results[index] = generated_user_stories
+        if (
+            cache_paths[index] is not None
+            and not isinstance(generated_user_stories, Exception)
+            and all(is_usable_user_story(story) for story in generated_user_stories)
+        ):
+            write_cached_user_stories(cache_paths[index], generated_user_stories)
+
+    return results
+
+
+def create_http_client():
+    """
+    Create the HTTP client shared by the OpenAI SDK and the GitHub API calls,
+    so all requests go through one HTTP/2 connection pool.
+    """
+    # Idle connections are kept for two minutes instead of httpx's default
+    # five seconds, so the GitHub connection opened by prewarm_connection()
+    # is still alive once the user stories have been generated.
+    import httpx
+
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_keepalive_connections=32, max_connections=64, keepalive_expiry=120.0
+        ),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+    )
+
+
+async def _post_github(http_client, url, authorization_header, payload, timeout=None):
+    """
+    POST a JSON payload to the GitHub API and return the response, or None
+    if the request failed (timeout, connection or protocol error). Only
+    failed connection attempts are retried: a request that reached the
+    server is never re-sent, so an issue cannot be created twice. timeout
+    overrides the client's timeout for this request.
+    """
+    import httpx
+
+    request_options = {} if timeout is None else {"timeout": timeout}
+    try:
+        async for attempt in AsyncRetrying(
+            retry=retry_if_exception_type(httpx.ConnectError),
+            wait=wait_random_exponential(min=0.5, max=8),
+            stop=stop_after_attempt(5),
+            reraise=True,
+        ):
+            with attempt:
+                return await http_client.post(
+                    url,
+                    content=orjson.dumps(payload),
+                    headers={**authorization_header, "Content-Type": "application/json"},
+                    **request_options,
+                )
+    except httpx.HTTPError as error:
+        print(f"Request to {url} failed: {error!r}")
+        return None
+
+
+def prewarm_connection(http_client, url):
+    """
+    Start a HEAD request to url in the background so the TCP/TLS handshake
+    overlaps with other work and the connection is already in the client's
+    pool when the first real request is sent. Failures are ignored.
+    """
+    import httpx
+
+    async def warm():
+        try:
+            await http_client.head(url, timeout=5)
+        except httpx.HTTPError:
+            pass
+
+    return asyncio.create_task(warm())
+
+
+async def create_github_issue(http_client, issue_url, authorization_header, issue_data):
+    """Create a GitHub issue and return True on success."""
+    issue_response = await _post_github(http_client, issue_url, authorization_header, issue_data)
+    if issue_response is None:
+        return False
+
+    if issue_response.status_code != 201:
+        print(f"Failed to create issue: {issue_response.status_code}, {issue_response.text}")
+        return False
+
+    issue = orjson.loads(issue_response.content)
+    issue_number = issue["number"]
+    issue_html_url = issue["html_url"]
+    print(f"GitHub issue created successfully: {issue_html_url}")
+    print(f"Issue number: {issue_number}")
+    return True
+
+
+def github_graphql_url(github_api_url):
+    """Derive the GraphQL endpoint from the REST API URL (github.com or GHES)."""
+    github_api_url = github_api_url.rstrip("/")
+    if github_api_url.endswith("/api/v3"):
+        return github_api_url[:-len("/v3")] + "/graphql"
+    return f"{github_api_url}/graphql"
+
+
+async def _post_graphql(
+    http_client, graphql_url, authorization_header, query, variables, timeout=None
+):
+    """Send a GraphQL request and return the decoded response, or None on HTTP errors."""
+    response = await _post_github(
+        http_client,
+        graphql_url,
+        authorization_header,
+        {"query": query, "variables": variables},
+        timeout,
+    )
+    if response is None:
+        return None
+    if response.status_code != 200:
+        print(f"GraphQL request failed: {response.status_code}, {response.text}")
+        return None
+    return orjson.loads(response.content)
+
+
+async def resolve_github_node_ids(
+    http_client, graphql_url, authorization_header, repo, label_list, assignee_list
+):
+    """
+    Look up the node IDs needed by the createIssue mutation in one query.
+    Returns (repository_id, label_ids, assignee_ids), or None if the query
+    fails or a label or user does not exist.
+    """
+    owner, name = repo.split("/", 1)
+    variables = {"owner": owner, "name": name}
+    label_fields = []
+    for index, label in enumerate(label_list):
+        variables[f"label{index}"] = label
+        label_fields.append(f"label{index}: label(name: $label{index}) {{ id }}")
+    user_fields = []
+    for index, assignee in enumerate(assignee_list):
+        variables[f"user{index}"] = assignee
+        user_fields.append(f"user{index}: user(login: $user{index}) {{ id }}")
+
+    declarations = ["$owner: String!", "$name: String!"]
+    declarations += [f"$label{index}: String!" for index in range(len(label_list))]
+    declarations += [f"$user{index}: String!" for index in range(len(assignee_list))]
+    query = (
+        f"query({', '.join(declarations)}) {{ "
+        f"repository(owner: $owner, name: $name) {{ id {' '.join(label_fields)} }} "
+        f"{' '.join(user_fields)} }}"
+    )
+
+    result = await _post_graphql(http_client, graphql_url, authorization_header, query, variables)
+    data = (result or {}).get("data") or {}
+    repository = data.get("repository")
+    if not repository:
+        return None
+
+    label_ids = [(repository.get(f"label{index}") or {}).get("id") for index in range(len(label_list))]
+    assignee_ids = [(data.get(f"user{index}") or {}).get("id") for index in range(len(assignee_list))]
+    if not all(label_ids) or not all(assignee_ids):
+        return None
+    return repository["id"], label_ids, assignee_ids
+
+
+async def create_github_issues_graphql(
+    http_client,
+    graphql_url,
+    authorization_header,
+    repository_id,
+    issues,
+    label_ids,
+    assignee_ids,
+):
+    """
+    Create several GitHub issues with aliased createIssue mutations in a
+    single GraphQL request. Returns the number of issues that failed.
+    """
+    import httpx
+
+    variables = {
+        "repositoryId": repository_id,
+        "labelIds": label_ids,
+        "assigneeIds": assignee_ids,
+    }
+    declarations = ["$repositoryId: ID!", "$labelIds: [ID!]", "$assigneeIds: [ID!]"]
+    mutations = []
+    for index, (title, body) in enumerate(issues):
+        variables[f"title{index}"] = title
+        variables[f"body{index}"] = body
+        declarations += [f"$title{index}: String!", f"$body{index}: String"]
+        mutations.append(
+            f"issue{index}: createIssue(input: {{repositoryId: $repositoryId, "
+            f"title: $title{index}, body: $body{index}, "
+            f"labelIds: $labelIds, assigneeIds: $assigneeIds}}) {{ issue {{ number url }} }}"
+        )
+    query = f"mutation({', '.join(declarations)}) {{ {' '.join(mutations)} }}"
+
+    result = await _post_graphql(
+        http_client,
+        graphql_url,
+        authorization_header,
+        query,
+        variables,
+        httpx.Timeout(GRAPHQL_MUTATION_TIMEOUT, connect=5.0),
+    )
+    if result is None:
+        return len(issues)
+
+    data = result.get("data") or {}
+    failures = 0
+    for index, (title, _) in enumerate(issues):
+        created = data.get(f"issue{index}") or {}
+        issue = created.get("issue")
+        if not issue:
+            print(f"Failed to create issue '{title}'")
+            failures += 1
+            continue
+        print(f"GitHub issue created successfully: {issue['url']}")
+        print(f"Issue number: {issue['number']}")
+
+    for error in result.get("errors") or []:
+        print(f"GraphQL error: {error.get('message')}")
+    return failures
+
+
+def _build_parser():
+    """Build the command-line parser."""
     parser = argparse.ArgumentParser(
         description="Use ChatGPT to generate a user story for a GitHub issue."
     )
@@ -184,6 +867,13 @@ def main():
     parser.add_argument(
         "--github-repository", type=str, required=True, help="The GitHub repository"
     )
+    parser.add_argument(
+        "--github-graphql-url",
+        type=str,
+        required=False,
+        default="",
+        help="The GitHub GraphQL API URL (derived from the API URL if empty)",
+    )
     parser.add_argument(
         "--github-token",
         type=str,
@@ -228,7 +918,8 @@ def main():
         "--issue-description",
         type=str,
         required=True,
-        help="Brief description of the feature or user story",
+        help="Brief description of the feature or user story, or a JSON array "
+        "of descriptions to create one issue per entry",
     )
     parser.add_argument(
         "--complexity",
@@ -258,9 +949,60 @@ def main():
         default="",
         help="Comma-separated list of assignees for the issue",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call the LLM instead of reusing a cached user story",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        required=False,
+        default=86400,
+        help="Maximum age in seconds of a reusable cached user story",
+    )
+    parser.add_argument(
+        "--num-variants",
+        type=int,
+        required=False,
+        default=1,
+        help="Number of candidate user stories to generate per description, "
+        "each created as a separate issue",
+    )
+    parser.add_argument(
+        "--retry-on-short",
+        type=int,
+        required=False,
+        default=0,
+        help="Number of times to re-sample user stories that come back empty "
+        "or too short",
+    )
+    parser.add_argument(
+        "--batch-mode",
+        action="store_true",
+        help="Generate the user stories through the OpenAI Batch API (cheaper, "
+        "but results can take up to 24 hours)",
+    )
+
+    return parser
+
+
+_PARSER = _build_parser()
+
+# Model settings come from the action inputs; read and converted once
+_OPENAI_MODEL = os.environ.get("INPUT_OPENAI_MODEL", "gpt-4o-mini")
+_MAX_TOKENS = int(os.environ.get("INPUT_MAX_TOKENS", "2000"))
+_TEMPERATURE = float(os.environ.get("INPUT_TEMPERATURE", "0.7"))
+_MAX_CONCURRENCY = max(1, int(os.environ.get("INPUT_MAX_CONCURRENCY", "8")))
+
+
+def main():
+    args = _PARSER.parse_args()
+    return asyncio.run(run(args))
 
-    args = parser.parse_args()
 
+async def run(args):
+    """Generate the user stories and create the GitHub issues."""
     github_api_url = args.github_api_url
     repo = args.github_repository
     github_token = args.github_token
@@ -275,122 +1017,137 @@ def main():
     labels = args.labels
     assignees = args.assignees
 
-    open_ai_model = os.environ.get("INPUT_OPENAI_MODEL", "gpt-4o-mini")
-    max_prompt_tokens = int(os.environ.get("INPUT_MAX_TOKENS", "2000"))
-    model_temperature = float(os.environ.get("INPUT_TEMPERATURE", "0.7"))
-
     authorization_header = {
         "Accept": "application/vnd.github.v3+json",
         "Authorization": f"token {github_token}",
     }
 
-    # Prepare the completion prompt with the user-provided information
-    user_prompt = f"""
-{COMPLETION_PROMPT}
+    if not openai_api_key and not azure_openai_api_key:
+        print("Error: Either openai_api_key or azure_openai_api_key must be provided")
+        return 1
 
-Title: {issue_title}
-Description: {issue_description}
-Complexity: {complexity}
-Estimated Duration: {duration}
+    issue_descriptions = parse_issue_descriptions(issue_description)
+    if not issue_descriptions:
+        print("Error: issue_description is a JSON array without any non-empty description")
+        return 1
 
-Please generate a complete user story that addresses this requirement.
-"""
+    user_prompts = [
+        build_user_prompt(issue_title, description, complexity, duration)
+        for description in issue_descriptions
+    ]
 
-    print(f"Generating user story with LLM...")
+    print(f"Generating {len(user_prompts)} user story(ies) with LLM...")
     print(f"Issue Title: {issue_title}")
-    print(f"Description: {issue_description}")
+    for description in issue_descriptions:
+        print(f"Description: {description}")
     print(f"Complexity: {complexity}")
     print(f"Duration: {duration}")
 
-    generated_user_story = ""
-    
-    # Use OpenAI or Azure OpenAI based on which API key is provided
-    if openai_api_key:
-        print("Using OpenAI API...")
-        openai_client = OpenAI(api_key=openai_api_key)
-        openai_response = openai_client.chat.completions.create(
-            model=open_ai_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant who writes detailed user stories for software development.",
-                },
-                {"role": "user", "content": SAMPLE_PROMPT},
-                {"role": "assistant", "content": GOOD_SAMPLE_RESPONSE},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=model_temperature,
-            max_tokens=max_prompt_tokens,
-        )
-        generated_user_story = openai_response.choices[0].message.content
+    num_variants = max(1, args.num_variants)
 
-    elif azure_openai_api_key:
-        print("Using Azure OpenAI API...")
-        azure_openai_client = AzureOpenAI(
-            api_key=azure_openai_api_key,
-            azure_endpoint=azure_openai_endpoint,
-            api_version=azure_openai_version
-        )
-        azure_openai_response = azure_openai_client.chat.completions.create(
-            model=open_ai_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant who writes detailed user stories for software development.",
-                },
-                {"role": "user", "content": SAMPLE_PROMPT},
-                {"role": "assistant", "content": GOOD_SAMPLE_RESPONSE},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=model_temperature,
-            max_tokens=max_prompt_tokens,
+    issue_url = f"{github_api_url}/repos/{repo}/issues"
+    label_list = [label.strip() for label in labels.split(",") if label.strip()]
+    assignee_list = [assignee.strip() for assignee in assignees.split(",") if assignee.strip()]
+
+    async with create_http_client() as http_client:
+        # The GitHub connection is opened while the user stories are generated
+        warmup = prewarm_connection(http_client, f"{github_api_url}/")
+
+        generation_results = await generate_user_stories(
+            http_client,
+            user_prompts,
+            openai_api_key,
+            azure_openai_api_key,
+            azure_openai_endpoint,
+            azure_openai_version,
+            _OPENAI_MODEL,
+            _TEMPERATURE,
+            _MAX_TOKENS,
+            _MAX_CONCURRENCY,
+            num_variants=num_variants,
+            cache_dir=None if args.no_cache else CACHE_DIR,
+            cache_ttl=args.cache_ttl,
+            batch_mode=args.batch_mode,
+            retry_on_short=max(0, args.retry_on_short),
         )
-        generated_user_story = azure_openai_response.choices[0].message.content
-    else:
-        print("Error: Either openai_api_key or azure_openai_api_key must be provided")
-        return 1
+        await warmup
 
-    print(f"Generated user story:\n{generated_user_story}")
+        exit_code = 0
+        generated_user_stories = []
+        for description, generation_result in zip(issue_descriptions, generation_results):
+            if isinstance(generation_result, Exception):
+                print(f"Failed to generate user story for '{description}': {generation_result}")
+                exit_code = 1
+                continue
+            for generated_user_story in generation_result:
+                if not is_usable_user_story(generated_user_story):
+                    print(
+                        f"Skipping empty or too short user story for '{description}': "
+                        f"{generated_user_story!r}"
+                    )
+                    exit_code = 1
+                    continue
+                generated_user_stories.append(generated_user_story)
 
-    # Extract title and body from the generated response
-    extracted_title = extract_title_from_response(generated_user_story)
-    extracted_body = extract_body_from_response(generated_user_story)
-    
-    print(f"\nExtracted title: {extracted_title}")
-    print(f"Using LLM-generated title instead of user-provided title: '{issue_title}'")
+        issues = []
+        for generated_user_story in generated_user_stories:
+            print(f"Generated user story:\n{generated_user_story}")
 
-    # Create the GitHub issue
-    issue_url = f"{github_api_url}/repos/{repo}/issues"
-    issue_data = {
-        "title": extracted_title,
-        "body": extracted_body,
-    }
+            # Extract title and body from the generated response
+            extracted_title, extracted_body = extract_title_and_body(generated_user_story)
 
-    # Add labels if provided
-    if labels:
-        label_list = [label.strip() for label in labels.split(",") if label.strip()]
-        if label_list:
-            issue_data["labels"] = label_list
-
-    # Add assignees if provided
-    if assignees:
-        assignee_list = [assignee.strip() for assignee in assignees.split(",") if assignee.strip()]
-        if assignee_list:
-            issue_data["assignees"] = assignee_list
-
-    print(f"Creating GitHub issue...")
-    issue_response = requests.post(issue_url, headers=authorization_header, json=issue_data)
-    
-    if issue_response.status_code != 201:
-        print(f"Failed to create issue: {issue_response.status_code}, {issue_response.text}")
-        return 1
-    
-    issue_number = issue_response.json()["number"]
-    issue_html_url = issue_response.json()["html_url"]
-    print(f"GitHub issue created successfully: {issue_html_url}")
-    print(f"Issue number: {issue_number}")
-    
-    return 0
+            print(f"\nExtracted title: {extracted_title}")
+            print(f"Using LLM-generated title instead of user-provided title: '{issue_title}'")
+            issues.append((extracted_title, extracted_body))
+
+        # Several issues are created with one GraphQL request. The REST API is
+        # used for a single issue, or when a label does not exist yet (REST
+        # creates missing labels, GraphQL needs their IDs).
+        node_ids = None
+        if len(issues) > 1:
+            graphql_url = args.github_graphql_url or github_graphql_url(github_api_url)
+            node_ids = await resolve_github_node_ids(
+                http_client, graphql_url, authorization_header, repo, label_list, assignee_list
+            )
+
+        if node_ids is not None:
+            repository_id, label_ids, assignee_ids = node_ids
+            print(f"Creating {len(issues)} GitHub issues...")
+            for start in range(0, len(issues), GRAPHQL_ISSUES_PER_REQUEST):
+                if await create_github_issues_graphql(
+                    http_client,
+                    graphql_url,
+                    authorization_header,
+                    repository_id,
+                    issues[start:start + GRAPHQL_ISSUES_PER_REQUEST],
+                    label_ids,
+                    assignee_ids,
+                ):
+                    exit_code = 1
+            return exit_code
+
+        for extracted_title, extracted_body in issues:
+            # Create the GitHub issue
+            issue_data = {
+                "title": extracted_title,
+                "body": extracted_body,
+            }
+
+            # Add labels if provided
+            if label_list:
+                issue_data["labels"] = label_list
+
+            # Add assignees if provided
+            if assignee_list:
+                issue_data["assignees"] = assignee_list
+
+            print(f"Creating GitHub issue...")
+            if not await create_github_issue(
+                http_client, issue_url, authorization_header, issue_data
+            ):
+                exit_code = 1
+
+        return exit_code
 
 
 if __name__ == "__main__":
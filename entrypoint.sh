@@ -2,9 +2,18 @@
 
 set -eu
 
+extra_args=()
+if [ "$INPUT_BATCH_MODE" = "true" ]; then
+  extra_args+=(--batch-mode)
+fi
+if [ "$INPUT_NO_CACHE" = "true" ]; then
+  extra_args+=(--no-cache)
+fi
+
 /action/create_issue_user_story.py \
   --github-api-url "$GITHUB_API_URL" \
   --github-repository "$GITHUB_REPOSITORY" \
+  --github-graphql-url "${GITHUB_GRAPHQL_URL:-}" \
   --github-token "$INPUT_GITHUB_TOKEN" \
   --openai-api-key "$INPUT_OPENAI_API_KEY" \
   --azure-openai-api-key "$INPUT_AZURE_OPENAI_API_KEY" \
@@ -14,5 +23,9 @@ set -eu
   --issue-description "$INPUT_ISSUE_DESCRIPTION" \
   --complexity "$INPUT_COMPLEXITY" \
   --duration "$INPUT_DURATION" \
+  --num-variants "$INPUT_NUM_VARIANTS" \
+  --retry-on-short "$INPUT_RETRY_ON_SHORT" \
+  --cache-ttl "$INPUT_CACHE_TTL" \
   --labels "$INPUT_LABELS" \
-  --assignees "$INPUT_ASSIGNEES"
+  --assignees "$INPUT_ASSIGNEES" \
+  "${extra_args[@]}"
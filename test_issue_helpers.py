@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""Test suite for the user story cache, input parsing, LLM sampling and GitHub helpers."""
+
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import orjson
+
+from create_issue_user_story import (
+    create_github_issue,
+    create_github_issues_graphql,
+    generate_user_stories,
+    github_graphql_url,
+    is_usable_user_story,
+    parse_issue_descriptions,
+    read_cached_user_stories,
+    run_batch_job,
+    write_cached_user_stories,
+)
+
+CACHE_TTL = 86400
+
+FULL_STORY = (
+    "# Allow Guest Checkout\n\n## User Story\n"
+    "As a shopper, I want to check out without an account so that I save time."
+)
+SHORT_STORY = "# Guest Checkout"
+
+
+class FakeResponse:
+    """Minimal stand-in for an httpx response."""
+
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.content = orjson.dumps(payload)
+        self.text = self.content.decode()
+
+
+class FakeHttpClient:
+    """Records POST requests and answers each one with the same response, or raises it if it is an exception."""
+
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    async def post(self, url, content=None, headers=None, timeout=None):
+        self.requests.append((url, orjson.loads(content)))
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+class FakeBatchClient:
+    """Stand-in for the OpenAI client's files and batches APIs; the batch finishes immediately."""
+
+    def __init__(self, batch, files):
+        self.batch = batch
+        self.files_by_id = files
+        self.uploads = []
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+
+    async def _create_file(self, file, purpose):
+        self.uploads.append(file[1])
+        return SimpleNamespace(id="file-input")
+
+    async def _file_content(self, file_id):
+        return SimpleNamespace(content=b"\n".join(orjson.dumps(line) for line in self.files_by_id[file_id]))
+
+    async def _create_batch(self, **kwargs):
+        return self.batch
+
+    async def _retrieve_batch(self, batch_id):
+        return self.batch
+
+
+def make_batch(status, output_file_id=None, error_file_id=None, errors=None):
+    """Build a Batch API batch object with the fields run_batch_job reads."""
+    return SimpleNamespace(
+        id="batch-1",
+        status=status,
+        output_file_id=output_file_id,
+        error_file_id=error_file_id,
+        errors=SimpleNamespace(data=[SimpleNamespace(message=message) for message in errors]) if errors else None,
+    )
+
+
+def batch_success(custom_id, *contents):
+    """Build an output file line with one choice per content, in reverse index order."""
+    choices = [
+        {"index": index, "message": {"role": "assistant", "content": content}}
+        for index, content in enumerate(contents)
+    ]
+    return {
+        "custom_id": custom_id,
+        "response": {"status_code": 200, "body": {"choices": choices[::-1]}},
+        "error": None,
+    }
+
+
+def batch_failure(custom_id, message):
+    """Build an error file line for a request the API rejected."""
+    return {
+        "custom_id": custom_id,
+        "response": {"status_code": 400, "body": {"error": {"message": message}}},
+        "error": None,
+    }
+
+
+def run_batch(client, request_count):
+    """Run run_batch_job() on request_count dummy prompts."""
+    messages_list = [[{"role": "user", "content": f"Prompt {index}"}] for index in range(request_count)]
+    return asyncio.run(run_batch_job(
+        client, "/v1/chat/completions", messages_list, "gpt-4o-mini", 0.7, 2000, num_variants=2,
+    ))
+
+
+def streamed_completion(contents):
+    """Build a streamed chat completion response with one choice per content."""
+    events = [
+        {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [{"index": index, "delta": {"content": content}, "finish_reason": "stop"}],
+        }
+        for index, content in enumerate(contents)
+    ]
+    body = b"".join(b"data: " + orjson.dumps(event) + b"\n\n" for event in events)
+    return httpx.Response(200, content=body + b"data: [DONE]\n\n", headers={"Content-Type": "text/event-stream"})
+
+
+def sample_with_responses(responses, num_variants, retry_on_short):
+    """
+    Run generate_user_stories() for one prompt against a mock OpenAI API that
+    streams the next entry of responses for each request. Returns the result
+    and the n= requested by each request.
+    """
+    requested = []
+
+    def handler(request):
+        requested.append(orjson.loads(request.content)["n"])
+        return streamed_completion(responses[len(requested) - 1])
+
+    async def generate():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+            return await generate_user_stories(
+                http_client, ["Allow guest checkout"], "sk-test", "", "", "",
+                "gpt-4o-mini", 0.7, 2000, 8,
+                num_variants=num_variants, retry_on_short=retry_on_short,
+            )
+
+    return asyncio.run(generate())[0], requested
+
+
+def test_cache_round_trip():
+    """Test that freshly written user stories are read back unchanged."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "llm-create-issue" / "entry.json"
+        write_cached_user_stories(path, ["# Story One", "# Story Two"])
+
+        user_stories = read_cached_user_stories(path, CACHE_TTL)
+        assert user_stories == ["# Story One", "# Story Two"], f"Unexpected cache content, got {user_stories!r}"
+    print("✓ Test passed: Cache round trip")
+
+
+def test_cache_expired_ttl():
+    """Test that an entry older than the TTL is ignored."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "entry.json"
+        write_cached_user_stories(path, ["# Old Story"])
+        stale = time.time() - CACHE_TTL - 60
+        os.utime(path, (stale, stale))
+
+        user_stories = read_cached_user_stories(path, CACHE_TTL)
+        assert user_stories is None, f"Expected expired entry to be ignored, got {user_stories!r}"
+    print("✓ Test passed: Expired cache entry")
+
+
+def test_cache_corrupt_json():
+    """Test that a truncated or corrupt cache file is treated as a miss."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "entry.json"
+        path.write_bytes(b'["# Truncated Sto')
+
+        user_stories = read_cached_user_stories(path, CACHE_TTL)
+        assert user_stories is None, f"Expected corrupt entry to be ignored, got {user_stories!r}"
+    print("✓ Test passed: Corrupt cache entry")
+
+
+def test_cache_non_list_payload():
+    """Test that valid JSON which is not a non-empty list is treated as a miss."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "entry.json"
+        for payload in (b'{"story": "# Story"}', b'"# Story"', b'[]'):
+            path.write_bytes(payload)
+            user_stories = read_cached_user_stories(path, CACHE_TTL)
+            assert user_stories is None, f"Expected {payload!r} to be ignored, got {user_stories!r}"
+    print("✓ Test passed: Non-list cache payload")
+
+
+def test_cache_missing_file():
+    """Test that a missing cache file is a miss rather than an error."""
+    with tempfile.TemporaryDirectory() as tmp:
+        user_stories = read_cached_user_stories(Path(tmp) / "missing.json", CACHE_TTL)
+        assert user_stories is None, f"Expected missing entry to be ignored, got {user_stories!r}"
+    print("✓ Test passed: Missing cache entry")
+
+
+def test_single_description():
+    """Test that plain text is a single description, kept verbatim."""
+    descriptions = parse_issue_descriptions("Allow guest checkout [beta]")
+    assert descriptions == ["Allow guest checkout [beta]"], f"Unexpected descriptions, got {descriptions!r}"
+    print("✓ Test passed: Single description")
+
+
+def test_json_array_descriptions():
+    """Test that a JSON array creates one description per non-empty entry."""
+    descriptions = parse_issue_descriptions('  ["Allow guest checkout", " ", "Save addresses"]\n')
+    assert descriptions == ["Allow guest checkout", "Save addresses"], f"Unexpected descriptions, got {descriptions!r}"
+    print("✓ Test passed: JSON array of descriptions")
+
+
+def test_invalid_json_is_single_description():
+    """Test that text starting with '[' but not valid JSON is a single description."""
+    text = "[WIP] Allow guest checkout"
+    descriptions = parse_issue_descriptions(text)
+    assert descriptions == [text], f"Expected the literal text, got {descriptions!r}"
+    print("✓ Test passed: Invalid JSON as single description")
+
+
+def test_non_string_array_is_single_description():
+    """Test that a JSON array of non-strings is a single description."""
+    text = '["Allow guest checkout", 2, null]'
+    descriptions = parse_issue_descriptions(text)
+    assert descriptions == [text], f"Expected the literal text, got {descriptions!r}"
+    print("✓ Test passed: Non-string JSON array as single description")
+
+
+def test_all_empty_array_is_rejected():
+    """Test that an array with only blank entries yields no descriptions."""
+    for text in ('["", ""]', '[" ", "\\n"]', '[]'):
+        descriptions = parse_issue_descriptions(text)
+        assert descriptions == [], f"Expected {text!r} to yield no descriptions, got {descriptions!r}"
+    print("✓ Test passed: All-empty JSON array rejected")
+
+
+def test_graphql_url_github_com():
+    """Test that the github.com REST API URL maps to its GraphQL endpoint."""
+    for api_url in ("https://api.github.com", "https://api.github.com/"):
+        graphql_url = github_graphql_url(api_url)
+        assert graphql_url == "https://api.github.com/graphql", f"Unexpected URL for {api_url!r}, got '{graphql_url}'"
+    print("✓ Test passed: GraphQL URL for github.com")
+
+
+def test_graphql_url_enterprise_server():
+    """Test that a GHES /api/v3 URL maps to /api/graphql."""
+    for api_url in ("https://ghes.example.com/api/v3", "https://ghes.example.com/api/v3/"):
+        graphql_url = github_graphql_url(api_url)
+        assert graphql_url == "https://ghes.example.com/api/graphql", f"Unexpected URL for {api_url!r}, got '{graphql_url}'"
+    print("✓ Test passed: GraphQL URL for GitHub Enterprise Server")
+
+
+def test_graphql_partial_failure_count():
+    """Test that a response with partial data and errors counts only the missing issues."""
+    client = FakeHttpClient(FakeResponse(200, {
+        "data": {
+            "issue0": {"issue": {"number": 1, "url": "https://github.com/o/r/issues/1"}},
+            "issue1": None,
+        },
+        "errors": [{"message": "Could not resolve to a node with the global id"}],
+    }))
+    issues = [("Allow guest checkout", "## User Story"), ("Save addresses", "## User Story")]
+
+    failures = asyncio.run(create_github_issues_graphql(
+        client, "https://api.github.com/graphql", {}, "R_1", issues, ["LA_1"], [],
+    ))
+    assert failures == 1, f"Expected 1 failure, got {failures}"
+    assert len(client.requests) == 1, f"Expected a single request, got {len(client.requests)}"
+    variables = client.requests[0][1]["variables"]
+    assert variables["title1"] == "Save addresses", f"Unexpected variables, got {variables!r}"
+    print("✓ Test passed: GraphQL partial failure count")
+
+
+def test_graphql_http_error_fails_all():
+    """Test that a non-200 GraphQL response counts every issue as failed."""
+    client = FakeHttpClient(FakeResponse(502, {"message": "Bad Gateway"}))
+    issues = [("Allow guest checkout", "## User Story"), ("Save addresses", "## User Story")]
+
+    failures = asyncio.run(create_github_issues_graphql(
+        client, "https://api.github.com/graphql", {}, "R_1", issues, [], [],
+    ))
+    assert failures == 2, f"Expected 2 failures, got {failures}"
+    print("✓ Test passed: GraphQL HTTP error fails all issues")
+
+
+def test_usable_user_story():
+    """Test that empty and too short generations are rejected."""
+    assert is_usable_user_story(FULL_STORY), "Expected a full story to be usable"
+    for story in ("", None, SHORT_STORY, "   \n" + SHORT_STORY + " " * 100):
+        assert not is_usable_user_story(story), f"Expected {story!r} to be rejected"
+    print("✓ Test passed: Usable user story check")
+
+
+def test_retry_on_short_resamples_missing_count():
+    """Test that only the short candidates are re-sampled, with n set to their count."""
+    user_stories, requested = sample_with_responses(
+        [[FULL_STORY, SHORT_STORY, ""], [FULL_STORY + " again", FULL_STORY + " twice"]],
+        num_variants=3,
+        retry_on_short=2,
+    )
+    assert requested == [3, 2], f"Unexpected n= per request, got {requested}"
+    assert user_stories == [FULL_STORY, FULL_STORY + " again", FULL_STORY + " twice"], f"Unexpected stories, got {user_stories!r}"
+    print("✓ Test passed: retry_on_short re-samples the missing count")
+
+
+def test_retry_on_short_exhausted():
+    """Test that the rejected candidates are returned once retry_on_short is used up."""
+    user_stories, requested = sample_with_responses(
+        [[SHORT_STORY, FULL_STORY], [""]],
+        num_variants=2,
+        retry_on_short=1,
+    )
+    assert requested == [2, 1], f"Unexpected n= per request, got {requested}"
+    assert user_stories == [FULL_STORY, ""], f"Unexpected stories, got {user_stories!r}"
+    print("✓ Test passed: retry_on_short exhausted")
+
+
+def test_batch_results_by_custom_id():
+    """Test that batch results are mapped back by custom_id and ordered by choice index."""
+    client = FakeBatchClient(make_batch("completed", output_file_id="file-output"), {
+        "file-output": [
+            batch_success("request-1", "# Story 1a", "# Story 1b"),
+            batch_success("request-0", "# Story 0a", "# Story 0b"),
+        ],
+    })
+
+    results = run_batch(client, 2)
+    assert results == [["# Story 0a", "# Story 0b"], ["# Story 1a", "# Story 1b"]], f"Unexpected results, got {results!r}"
+    assert client.uploads[0].count(b"\n") == 2, "Expected one JSONL line per request"
+    print("✓ Test passed: Batch results mapped by custom_id")
+
+
+def test_batch_error_file_is_merged():
+    """Test that failed requests are read from the error file, and missing ones reported."""
+    client = FakeBatchClient(make_batch("completed", "file-output", "file-errors"), {
+        "file-output": [batch_success("request-0", "# Story 0a", "# Story 0b")],
+        "file-errors": [batch_failure("request-1", "This model's maximum context length is exceeded")],
+    })
+
+    results = run_batch(client, 3)
+    assert results[0] == ["# Story 0a", "# Story 0b"], f"Unexpected result, got {results[0]!r}"
+    assert isinstance(results[1], RuntimeError), f"Expected an error, got {results[1]!r}"
+    assert "maximum context length" in str(results[1]), f"Unexpected error, got '{results[1]}'"
+    assert "No result in batch batch-1" in str(results[2]), f"Unexpected error, got '{results[2]!r}'"
+    print("✓ Test passed: Batch error file merged")
+
+
+def test_batch_all_requests_failed():
+    """Test that a completed batch with only an error file reports each request's error."""
+    client = FakeBatchClient(make_batch("completed", error_file_id="file-errors"), {
+        "file-errors": [
+            batch_failure("request-0", "Invalid model"),
+            batch_failure("request-1", "Invalid model"),
+        ],
+    })
+
+    results = run_batch(client, 2)
+    assert all("Invalid model" in str(result) for result in results), f"Unexpected results, got {results!r}"
+    print("✓ Test passed: Batch with only failed requests")
+
+
+def test_batch_validation_failure():
+    """Test that a failed batch raises with its validation errors."""
+    client = FakeBatchClient(make_batch("failed", errors=["Line 1: invalid JSON"]), {})
+
+    try:
+        run_batch(client, 1)
+    except RuntimeError as error:
+        assert "Line 1: invalid JSON" in str(error), f"Unexpected error, got '{error}'"
+    else:
+        raise AssertionError("Expected a failed batch to raise")
+    print("✓ Test passed: Batch validation failure")
+
+
+def test_graphql_read_timeout_is_not_resent():
+    """Test that a timed out mutation counts every issue as failed and is not re-sent."""
+    client = FakeHttpClient(httpx.ReadTimeout("timed out"))
+    issues = [("Allow guest checkout", "## User Story"), ("Save addresses", "## User Story")]
+
+    failures = asyncio.run(create_github_issues_graphql(
+        client, "https://api.github.com/graphql", {}, "R_1", issues, [], [],
+    ))
+    assert failures == 2, f"Expected 2 failures, got {failures}"
+    assert len(client.requests) == 1, f"Expected the mutation to be sent once, got {len(client.requests)}"
+    print("✓ Test passed: GraphQL read timeout not re-sent")
+
+
+def test_rest_protocol_error_is_a_failure():
+    """Test that a transport error while creating an issue is reported as a failure."""
+    client = FakeHttpClient(httpx.RemoteProtocolError("connection closed"))
+
+    created = asyncio.run(create_github_issue(
+        client, "https://api.github.com/repos/o/r/issues", {}, {"title": "Allow guest checkout"},
+    ))
+    assert created is False, f"Expected the issue creation to fail, got {created!r}"
+    assert len(client.requests) == 1, f"Expected the request to be sent once, got {len(client.requests)}"
+    print("✓ Test passed: REST protocol error is a failure")
+
+
+def run_all_tests():
+    """Run all test cases."""
+    print("Running helper tests...\n")
+
+    test_cache_round_trip()
+    test_cache_expired_ttl()
+    test_cache_corrupt_json()
+    test_cache_non_list_payload()
+    test_cache_missing_file()
+    test_single_description()
+    test_json_array_descriptions()
+    test_invalid_json_is_single_description()
+    test_non_string_array_is_single_description()
+    test_all_empty_array_is_rejected()
+    test_usable_user_story()
+    test_retry_on_short_resamples_missing_count()
+    test_retry_on_short_exhausted()
+    test_batch_results_by_custom_id()
+    test_batch_error_file_is_merged()
+    test_batch_all_requests_failed()
+    test_batch_validation_failure()
+    test_graphql_url_github_com()
+    test_graphql_url_enterprise_server()
+    test_graphql_partial_failure_count()
+    test_graphql_http_error_fails_all()
+    test_graphql_read_timeout_is_not_resent()
+    test_rest_protocol_error_is_a_failure()
+
+    print("\n✅ All tests passed!")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
 """Test suite for title extraction from LLM responses."""
 
-from create_issue_user_story import extract_title_from_response, extract_body_from_response
+import time
+
+from create_issue_user_story import (
+    extract_title_from_response,
+    extract_body_from_response,
+    extract_title_from_partial_response,
+    extract_title_and_body,
+)
 
 
 def test_standard_markdown_header():
@@ -152,6 +159,74 @@ As a user, I want to toggle between light and dark modes so that I can use the a
     print("✓ Test passed: Real-world example")
 
 
+def test_placeholder_header_followed_by_title_prefix():
+    """Test that a valid 'Title:' line is used when the header is a placeholder."""
+    response = """# Title
+Title: Add Export to CSV
+
+## User Story
+As a user, I want to export my data."""
+
+    title = extract_title_from_response(response)
+    assert title == "Add Export to CSV", f"Expected 'Add Export to CSV', got '{title}'"
+    print("✓ Test passed: Placeholder header followed by 'Title:' line")
+
+
+def test_body_extraction_with_title_prefix():
+    """Test that body extraction removes a 'Title:' line."""
+    response = """Title: Add New Feature
+
+## User Story
+As a user, I want to add a new feature."""
+
+    body = extract_body_from_response(response)
+    assert body.startswith("## User Story"), f"Body should start with the user story section, got '{body}'"
+    print("✓ Test passed: Body extraction removes 'Title:' line")
+
+
+def test_partial_response_title():
+    """Test title detection on a streamed response that is still arriving."""
+    assert extract_title_from_partial_response("# Implement Dark") is None, "Incomplete line should not be used"
+
+    title = extract_title_from_partial_response("# Implement Dark Mode\n\n## User")
+    assert title == "Implement Dark Mode", f"Expected 'Implement Dark Mode', got '{title}'"
+
+    # A placeholder must not end detection before the search lines are complete
+    assert extract_title_from_partial_response("# Title\n\n") is None, "Placeholder should wait for more lines"
+    title = extract_title_from_partial_response("# Title\n\n## User Story\nAs a user\n\n## Acc")
+    assert title == "", f"Expected no title after the search lines, got '{title}'"
+    print("✓ Test passed: Partial response title detection")
+
+
+def test_title_and_body_combined():
+    """Test that the combined extractor agrees with the separate extractors."""
+    response = """# Title
+Title: Add Export to CSV
+
+## User Story
+As a user, I want to export my data."""
+
+    title, body = extract_title_and_body(response)
+    assert title == extract_title_from_response(response), f"Title mismatch, got '{title}'"
+    assert body == extract_body_from_response(response), f"Body mismatch, got '{body}'"
+    # The body starts after the first title line, even if it is a placeholder
+    assert body.startswith("Title: Add Export to CSV"), f"Unexpected body start, got '{body}'"
+    print("✓ Test passed: Combined title and body extraction")
+
+
+def test_long_whitespace_run_in_title():
+    """Test that a title line with a long whitespace run is extracted in linear time."""
+    response = "# a" + " " * 200000 + "b   \n\n## User Story\nAs a user, I want a title."
+
+    start = time.perf_counter()
+    title, body = extract_title_and_body(response)
+    elapsed = time.perf_counter() - start
+    assert title == "a" + " " * 200000 + "b", f"Unexpected title of length {len(title)}"
+    assert body.startswith("## User Story"), f"Unexpected body start, got '{body[:20]}'"
+    assert elapsed < 0.5, f"Extraction took {elapsed:.2f}s"
+    print("✓ Test passed: Long whitespace run in title")
+
+
 def run_all_tests():
     """Run all test cases."""
     print("Running title extraction tests...\n")
@@ -165,6 +240,11 @@ def run_all_tests():
     test_body_extraction()
     test_multiline_title_edge_case()
     test_real_world_example()
+    test_placeholder_header_followed_by_title_prefix()
+    test_body_extraction_with_title_prefix()
+    test_partial_response_title()
+    test_title_and_body_combined()
+    test_long_whitespace_run_in_title()
     
     print("\n✅ All tests passed!")
 